@@ -0,0 +1,102 @@
+"""
+A disk-backed cache backend for fastapi-cache.
+
+Entries survive process restarts and are shared across workers. Expired
+entries are kept and returned with a ttl of 0 so callers can revalidate
+stale data instead of refetching it from scratch.
+"""
+
+import time
+from typing import Optional, Tuple
+
+import aiosqlite
+from fastapi_cache.backends import Backend
+
+
+class SQLiteBackend(Backend):
+    """
+    A cache backend that stores entries in a SQLite database.
+    """
+
+    def __init__(self, path: str = "cache.db"):
+        self.path = path
+        self._initialized = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """
+        Open a connection, creating the cache table on first use.
+        """
+        connection = await aiosqlite.connect(self.path)
+        if not self._initialized:
+            await connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache"
+                " (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+            await connection.commit()
+            self._initialized = True
+        return connection
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        """
+        Get a value and its remaining ttl, 0 if the entry is stale.
+        """
+        connection = await self._connect()
+        try:
+            async with connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        finally:
+            await connection.close()
+
+        if row is None:
+            return 0, None
+
+        value, expires_at = row
+        return max(0, int(expires_at - time.time())), value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Get a value, stale or not.
+        """
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        """
+        Set a value with an expiry in seconds.
+        """
+        expires_at = time.time() + (expire or 0)
+        connection = await self._connect()
+        try:
+            await connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at)"
+                " VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            await connection.commit()
+        finally:
+            await connection.close()
+
+    async def clear(
+        self, namespace: Optional[str] = None, key: Optional[str] = None
+    ) -> int:
+        """
+        Clear entries by namespace, by key, or entirely.
+        """
+        connection = await self._connect()
+        try:
+            if namespace:
+                cursor = await connection.execute(
+                    "DELETE FROM cache WHERE key LIKE ?", (f"{namespace}%",)
+                )
+            elif key:
+                cursor = await connection.execute(
+                    "DELETE FROM cache WHERE key = ?", (key,)
+                )
+            else:
+                cursor = await connection.execute("DELETE FROM cache")
+            await connection.commit()
+            return cursor.rowcount
+        finally:
+            await connection.close()
@@ -2,10 +2,15 @@
 Logging configuration for FastAPI.
 """
 
-import json
+import atexit
 import logging
+import queue
 import sys
-from typing import Any, Dict
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+import orjson
 
 
 def make_record_with_extra(
@@ -22,6 +27,16 @@ original_makeRecord = logging.Logger.makeRecord
 logging.Logger.makeRecord = make_record_with_extra
 
 
+class RawQueueHandler(QueueHandler):
+    """
+    A queue handler that enqueues records unformatted, leaving all
+    formatting to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 class JSONFormatter(logging.Formatter):
     """
     A formatter that outputs JSON strings after parsing the LogRecord.
@@ -32,30 +47,22 @@ class JSONFormatter(logging.Formatter):
         Format the access log into a JSON string.
         """
         try:
-            # Parse the access log message which is typically in the format:
-            # "IP:port - - [timestamp] "METHOD /path HTTP/version" status_code size"
-            parts = record.getMessage().split()
-            if len(parts) >= 7:
-                client = parts[0]
-                timestamp = parts[3].strip("[]")
-                method = parts[5].strip('"')
-                path = parts[6].strip('"')
-                status_code = parts[8]
-                size = parts[9]
-
-                log_data.update(
-                    {
-                        "type": "http",
-                        "client": client,
-                        "method": method,
-                        "path": path,
-                        "status_code": int(status_code),
-                        "size": int(size),
-                        "timestamp": timestamp,
-                    }
-                )
-        except (IndexError, ValueError):
-            # If parsing fails, keep the original message
+            # uvicorn access records carry the already-split components in
+            # record.args: (client, method, path, http_version, status_code);
+            # binding them directly skips formatting and re-parsing the message
+            client, method, path, _http_version, status_code = record.args
+
+            log_data.update(
+                {
+                    "type": "http",
+                    "client": client,
+                    "method": method,
+                    "path": path,
+                    "status_code": int(status_code),
+                }
+            )
+        except (TypeError, ValueError):
+            # If the args don't match, keep the original message
             pass
 
         return log_data
@@ -67,27 +74,20 @@ class JSONFormatter(logging.Formatter):
         Format the httptools_impl log into a JSON string.
         """
         try:
-            # Parse the httptools_impl log message which is typically in the format:
-            # "IP:port - "METHOD /path HTTP/version" status_code"
-            parts = record.getMessage().split()
-            if len(parts) >= 5:
-                client = parts[0]
-                method = parts[2].strip('"')
-                path = parts[3].strip('"')
-                status_code = parts[5]
-
-                log_data.update(
-                    {
-                        "type": "http",
-                        "client": client,
-                        "method": method,
-                        "path": path,
-                        "status_code": int(status_code),
-                    }
-                )
-                del log_data["message"]
-        except (IndexError, ValueError):
-            # If parsing fails, keep the original message
+            client, method, path, _http_version, status_code = record.args
+
+            log_data.update(
+                {
+                    "type": "http",
+                    "client": client,
+                    "method": method,
+                    "path": path,
+                    "status_code": int(status_code),
+                }
+            )
+            del log_data["message"]
+        except (TypeError, ValueError):
+            # If the args don't match, keep the original message
             pass
 
         return log_data
@@ -96,8 +96,9 @@ class JSONFormatter(logging.Formatter):
         """
         Format the LogRecord into a JSON string.
         """
+        created = datetime.fromtimestamp(record.created)
         log_data: Dict[str, Any] = {
-            "timestamp": self.formatTime(record),
+            "timestamp": f"{created:%Y-%m-%d %H:%M:%S},{int(record.msecs):03d}",
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
@@ -125,13 +126,29 @@ class JSONFormatter(logging.Formatter):
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
 
-        return json.dumps(log_data)
+        return orjson.dumps(log_data, default=str).decode("utf-8")
+
+
+_queue_listener: Optional[QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
+    """
+    Stop the listener thread, draining any queued records to stdout.
+    """
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
 
 def setup_logging() -> None:
     """
     Set up logging configuration.
     """
+    global _queue_listener
+
     # Remove all existing handlers
     root_logger = logging.getLogger()
     for handler in root_logger.handlers[:]:
@@ -144,9 +161,21 @@ def setup_logging() -> None:
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(json_formatter)
 
+    # Log calls only enqueue the record; formatting and the stdout write
+    # happen on the listener thread, off the request path
+    log_queue = queue.SimpleQueue()
+    queue_handler = RawQueueHandler(log_queue)
+
+    _stop_queue_listener()
+    _queue_listener = QueueListener(log_queue, stream_handler)
+    _queue_listener.start()
+    # The listener thread is a daemon, so flush it at interpreter exit or
+    # records still in the queue would be dropped
+    atexit.register(_stop_queue_listener)
+
     # Configure root logger
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(stream_handler)
+    root_logger.addHandler(queue_handler)
 
     # Disable uvicorn's default logging
     logging.getLogger("uvicorn").handlers = []
@@ -164,6 +193,6 @@ def setup_logging() -> None:
 
     for logger in uvicorn_loggers:
         logger.setLevel(logging.INFO)
-        logger.addHandler(stream_handler)
+        logger.addHandler(queue_handler)
         # Prevent propagation to avoid duplicate logs
         logger.propagate = False
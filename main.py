@@ -8,22 +8,28 @@ The console is sent in the url of the request.
 The response is a json object with the console and the list of matches.
 """
 
-import json
+import asyncio
+import functools
 import logging
+import os
 import re
+import sys
 import typing
 import urllib.parse
 from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-import requests
-from bs4 import BeautifulSoup
+import httpx
+import msgpack
+import orjson
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
-from fastapi_cache.decorator import cache
-from thefuzz import fuzz, process
+from lxml import etree
+from rapidfuzz import fuzz, process, utils
 
+from cache_backend import SQLiteBackend
 from logging_config import setup_logging
 
 setup_logging()
@@ -31,6 +37,9 @@ logger = logging.getLogger(__name__)
 
 MIN_MATCH_SCORE = 90
 
+# cache scrapes for 1 day, then revalidate
+GAMES_CACHE_TTL = 60 * 60 * 24
+
 
 rom_mapping = {
     "PUAE": "Commodore - Amiga",
@@ -94,14 +103,33 @@ common_renames = {
     "Megaman": "Mega Man",
 }
 
+_extension_re = re.compile(r"\.\w+$")
+_parenthesis_re = re.compile(r"\s*\([^)]*\)")
+_bracket_re = re.compile(r"\s*\[[^\]]*\]")
+_rename_re = re.compile("|".join(map(re.escape, common_renames)))
+
+
+def _rename(match: re.Match) -> str:
+    return common_renames[match.group(0)]
+
+
+http_client: typing.Optional[httpx.AsyncClient] = None
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     """
-    Initialize the cache.
+    Initialize the cache and the shared http client.
     """
-    FastAPICache.init(InMemoryBackend())
+    global http_client
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+    FastAPICache.init(SQLiteBackend())
     yield
+    await http_client.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -126,13 +154,10 @@ class PrettyJSONResponse(Response):
         """
         Render the json with indents.
         """
-        return json.dumps(
+        return orjson.dumps(
             content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=4,
-            separators=(", ", ": "),
-        ).encode("utf-8")
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        )
 
 
 @app.post("/matches/{console}/{image_type}")
@@ -145,8 +170,9 @@ async def handle_rom_list(console: str, image_type: str, request: Request):
     matches, games = await process_game_list(console, body, image_type)
 
     if request.headers.get("content-type") == "text/plain":
-        output = [f"{game}\t{matches[game]}" for game in matches]
-        return Response("\n".join(output), media_type="text/plain")
+        # stream lines out instead of building the whole body in memory
+        output = (f"{game}\t{image_url}\n" for game, image_url in matches.items())
+        return StreamingResponse(output, media_type="text/plain")
 
     return PrettyJSONResponse(
         {
@@ -162,44 +188,107 @@ async def handle_rom_list(console: str, image_type: str, request: Request):
     )
 
 
+@functools.lru_cache(maxsize=8192)
 def scrub_game_name(game_name: str) -> str:
     """
     Scrub the game name.
     """
-    game_name = re.sub(r"\.\w+$", "", game_name)
+    game_name = _extension_re.sub("", game_name)
 
     # remove the contents inside of parenthesis or brackets
-    game_name = re.sub(r"\s*\([^)]*\)", "", game_name)
-    game_name = re.sub(r"\s*\[[^\]]*\]", "", game_name)
+    game_name = _parenthesis_re.sub("", game_name)
+    game_name = _bracket_re.sub("", game_name)
 
-    for old_name, new_name in common_renames.items():
-        game_name = game_name.replace(old_name, new_name)
+    game_name = _rename_re.sub(_rename, game_name)
 
     return game_name.strip()
 
 
-# cache for 1 day
-@cache(expire=60 * 60 * 24)
-def get_games_from_libretro(base_url: str) -> dict[str, str]:
+def trigrams(game_name: str) -> set:
     """
-    Get the games from the libretro api.
+    The set of character trigrams in the game name.
     """
-    logger.info("getting games from libretro", extra={"base_url": base_url})
-    response = requests.get(base_url, timeout=10)
-    if response.status_code != 200:
-        return {}
-
-    html = response.text
-    soup = BeautifulSoup(html, "html.parser")
-    links = soup.find_all("a")
-
-    game_mapping = {
-        scrub_game_name(link.text): link.get("href")
-        for link in links
-        if link.get("href").endswith(".png")
+    if len(game_name) < 3:
+        return {game_name}
+
+    return {game_name[i : i + 3] for i in range(len(game_name) - 2)}
+
+
+def build_trigram_index(processed_names: typing.Iterable[str]) -> dict[str, list]:
+    """
+    Map each trigram to the positions of the game names containing it.
+    """
+    index = {}
+    for position, processed_name in enumerate(processed_names):
+        for trigram in trigrams(processed_name):
+            index.setdefault(trigram, []).append(position)
+
+    return index
+
+
+def build_games_entry(etag: typing.Optional[str], game_mapping: dict) -> dict:
+    """
+    Build a cache entry with the name variants precomputed per scrape.
+    """
+    names = list(game_mapping.keys())
+    processed_names = [utils.default_process(name) for name in names]
+
+    return {
+        "etag": etag,
+        "mapping": game_mapping,
+        "names": names,
+        "processed_names": processed_names,
+        "index": build_trigram_index(processed_names),
     }
 
-    return game_mapping
+
+async def get_games_from_libretro(base_url: str) -> dict:
+    """
+    Get the games from the libretro api, with the name variants and the
+    trigram index precomputed per scrape.
+
+    Fresh results come from the disk cache; stale entries are revalidated
+    with a conditional request so unchanged indexes skip the re-scrape.
+    """
+    backend = FastAPICache.get_backend()
+    cache_key = f"libretro-games:{base_url}"
+
+    ttl, cached = await backend.get_with_ttl(cache_key)
+    entry = msgpack.unpackb(cached) if cached is not None else None
+    if entry is not None and ttl > 0:
+        return entry
+
+    headers = {}
+    if entry is not None and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+
+    logger.info("getting games from libretro", extra={"base_url": base_url})
+    game_mapping = {}
+    async with http_client.stream("GET", base_url, headers=headers) as response:
+        if response.status_code == 304:
+            await backend.set(cache_key, cached, expire=GAMES_CACHE_TTL)
+            return entry
+
+        if response.status_code != 200:
+            return {}
+
+        etag = response.headers.get("etag")
+
+        # parse anchors as chunks arrive instead of buffering the whole page
+        parser = etree.HTMLPullParser(events=("end",), tag="a")
+        async for chunk in response.aiter_text(chunk_size=65536):
+            parser.feed(chunk)
+            for _, link in parser.read_events():
+                href = link.get("href")
+                if href and href.endswith(".png"):
+                    game_mapping[scrub_game_name(link.text or "")] = href
+                link.clear()
+
+    entry = build_games_entry(etag, game_mapping)
+
+    await backend.set(cache_key, msgpack.packb(entry), expire=GAMES_CACHE_TTL)
+
+    return entry
 
 
 async def process_game_list(
@@ -208,9 +297,11 @@ async def process_game_list(
     """
     Process the game list.
     """
-    games = [game.strip() for game in body.decode("utf-8").split("\n") if game.strip()]
-    games = [game for game in games if not game.startswith(".")]
-    games = [game for game in games if game != "neogeo.zip"]
+    games = [
+        game
+        for game in (line.strip() for line in body.decode("utf-8").splitlines())
+        if game and not game.startswith(".") and game != "neogeo.zip"
+    ]
 
     mapped_console = rom_mapping.get(console, None)
     if not mapped_console:
@@ -230,79 +321,122 @@ async def process_game_list(
     base_url = f"https://thumbnails.libretro.com/{mapped_console}/{image_folder}/"
     quoted_base_url = urllib.parse.quote(base_url, safe=":/")
 
-    game_mapping = await get_games_from_libretro(base_url)
+    entry = await get_games_from_libretro(base_url)
+    game_mapping = entry.get("mapping", {})
     if len(game_mapping) == 0:
         logger.warning("no games found", extra={"console": console})
         return {}, {}
 
     matches = {}
 
-    fuzzers = [
-        fuzz.ratio,
-        fuzz.token_sort_ratio,
-        fuzz.token_set_ratio,
-        fuzz.partial_ratio,
-        fuzz.partial_token_sort_ratio,
+    all_games = games.copy()
+    scrubbed_games = [scrub_game_name(game) for game in games]
+
+    # positions into game_names, which the trigram index is built over
+    game_names = [sys.intern(name) for name in entry["names"]]
+    name_positions = {name: position for position, name in enumerate(game_names)}
+    available = [True] * len(game_names)
+
+    matched = [scrubbed_game in game_mapping for scrubbed_game in scrubbed_games]
+    matches.update(
+        {
+            game: f"{quoted_base_url}{game_mapping[scrubbed_game]}"
+            for game, scrubbed_game, was_matched in zip(games, scrubbed_games, matched)
+            if was_matched
+        }
+    )
+    for scrubbed_game in {
+        scrubbed_game
+        for scrubbed_game, was_matched in zip(scrubbed_games, matched)
+        if was_matched
+    }:
+        available[name_positions[scrubbed_game]] = False
+
+    games = [game for game, was_matched in zip(games, matched) if not was_matched]
+    scrubbed_games = [
+        scrubbed_game
+        for scrubbed_game, was_matched in zip(scrubbed_games, matched)
+        if not was_matched
     ]
 
-    exact_matches = []
-    all_games = games.copy()
-    for game in games:
-        scrubbed_game = scrub_game_name(game)
-        exact_match = game_mapping.get(scrubbed_game, None)
-        if exact_match:
-            matches[game] = f"{quoted_base_url}{exact_match}"
-            del game_mapping[scrubbed_game]
-            exact_matches.append(game)
-
-    for exact_match in exact_matches:
-        games.remove(exact_match)
-
-    game_names = list(game_mapping.keys())
-    for game in games:
-        scrubbed_game = scrub_game_name(game)
-
-        best_match = None
-        for fuzzer in fuzzers:
-            best_match = process.extractOne(scrubbed_game, game_names, scorer=fuzzer)
-
-            if best_match[1] < MIN_MATCH_SCORE:
-                logger.warning(
-                    "score too low",
-                    extra={
-                        "game": game,
-                        "scrubbed_game": scrubbed_game,
-                        "score": best_match[1],
-                        "best_match": best_match[0],
-                    },
-                )
-                continue
-
-            break
-
-        if not best_match:
-            logger.warning(
-                "no match found",
-                extra={
-                    "game": game,
-                    "scrubbed_game": scrubbed_game,
-                },
-            )
-            continue
+    # fuzzy matching is pure CPU work; run it off the event loop so one
+    # request's matching doesn't stall the other handlers
+    fuzzy_matches = await asyncio.to_thread(
+        find_fuzzy_matches,
+        games,
+        scrubbed_games,
+        entry["processed_names"],
+        entry["index"],
+        available,
+    )
+    for game, best_position in fuzzy_matches.items():
+        image_name = game_mapping[game_names[best_position]]
+        matches[game] = f"{quoted_base_url}{image_name}"
+
+    return matches, all_games
+
 
-        if best_match[1] < MIN_MATCH_SCORE:
+def find_fuzzy_matches(
+    games: list,
+    scrubbed_games: list,
+    processed_names: list,
+    trigram_index: dict[str, list],
+    available: list,
+) -> dict[str, int]:
+    """
+    Fuzzy-match each game to a position in the game names.
+    """
+    # normalize each query once; the choice variants come precomputed
+    # from the cache entry
+    processed_games = [utils.default_process(name) for name in scrubbed_games]
+
+    def match_game(index: int) -> typing.Optional[int]:
+        # only score candidates that share enough trigrams with the query
+        query_trigrams = trigrams(processed_games[index])
+        overlaps = {}
+        for trigram in query_trigrams:
+            for position in trigram_index.get(trigram, ()):
+                overlaps[position] = overlaps.get(position, 0) + 1
+
+        threshold = min(3, max(1, len(query_trigrams) // 3))
+        candidates = [
+            position
+            for position, overlap in overlaps.items()
+            if overlap >= threshold and available[position]
+        ]
+        if not candidates:
+            return None
+
+        # WRatio combines the ratio/partial/token scorers in one weighted
+        # pass, so one call replaces the old five-scorer cascade
+        best_match = process.extractOne(
+            processed_games[index],
+            [processed_names[position] for position in candidates],
+            scorer=fuzz.WRatio,
+            score_cutoff=MIN_MATCH_SCORE,
+        )
+        if best_match:
+            return candidates[best_match[2]]
+
+        return None
+
+    # rapidfuzz releases the GIL in its scorers, so threads spread the
+    # scoring across cores without any pickling
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(match_game, range(len(games)))
+
+    fuzzy_matches = {}
+    for index, best_position in enumerate(results):
+        if best_position is None:
             logger.warning(
-                "score too low, no match found",
+                "no match found",
                 extra={
-                    "game": game,
-                    "scrubbed_game": scrubbed_game,
-                    "score": best_match[1],
-                    "best_match": best_match[0],
+                    "game": games[index],
+                    "scrubbed_game": scrubbed_games[index],
                 },
             )
             continue
 
-        image_name = game_mapping[best_match[0]]
-        matches[game] = f"{quoted_base_url}{image_name}"
+        fuzzy_matches[games[index]] = best_position
 
-    return matches, all_games
+    return fuzzy_matches